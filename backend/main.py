@@ -1,18 +1,52 @@
+import time
+
+# App clock: import, startup and ready timings are measured from when main.py starts importing
+APP_IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+import asyncio
 import os
-import shutil
 from datetime import datetime
-from src.config import get_upload_dir, get_vector_store_path
-from src.document_loader import load_and_split_pdf
+from src.config import get_upload_dir
 from src.models import get_embeddings_model, get_llm_model
-from src.vector_store import create_vector_store, save_vector_store, load_vector_store
-from src.rag import create_rag_chain
+from src.upload_handler import (
+    UploadRejected,
+    stream_upload_to_temp,
+    commit_upload,
+    discard_temp_upload,
+    is_temp_upload,
+    UploadSizeLimitMiddleware
+)
 from fastapi.middleware.cors import CORSMiddleware
 
+# LangChain, FAISS and the provider SDKs are imported during background warm-up
+# (or on first use), so the app can start serving health checks right away
+IMPORT_SECONDS = time.perf_counter() - APP_IMPORT_STARTED
+
+def process_age_seconds():
+    """
+    Seconds since the OS started this process, so interpreter start, uvicorn import and
+    worker spawn are included. Returns None where /proc is not available (e.g. Windows).
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Skip past the command name, which may contain spaces; starttime is field 22
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
 app = FastAPI()
 
+# Reject oversized uploads before FastAPI receives and spools the whole multipart body.
+# Added before CORSMiddleware so CORS wraps it and its 413 responses carry CORS headers.
+app.add_middleware(UploadSizeLimitMiddleware, paths=("/ingest",))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -21,81 +55,227 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables to hold models and vector store
+# Global variables to hold models and this worker's view of the shared vector store
 models = {}
-vector_store = None
+shared_index = None
+index_watcher = None
+
+# Warm-up progress reported by /ready
+startup_state = {
+    "status": "starting",  # starting -> warming_up -> ready | failed
+    "error": None,
+    "timings": {"import_seconds": round(IMPORT_SECONDS, 3)}
+}
+warmup_task = None
+
+def timed(name, func, *args, **kwargs):
+    """Runs func and records how long it took under startup_state["timings"]."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    startup_state["timings"][f"{name}_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+def import_heavy_modules():
+    """Imports the LangChain/FAISS-backed modules ahead of the first request."""
+    import src.document_loader
+    import src.rag
+    import src.index_sync
+
+def load_shared_index(embedding_model, provider):
+    from src.index_sync import SharedVectorStore
+    
+    index = SharedVectorStore(provider=provider)
+    index.refresh(embedding_model)
+    return index
+
+async def warm_up():
+    """
+    Builds model clients and loads the vector store in the background.
+    Blocking work runs in the threadpool so /health and /ready stay responsive.
+    """
+    global shared_index, index_watcher
+    from src.config import MODEL_PROVIDER
+    
+    startup_state["status"] = "warming_up"
+    try:
+        await run_in_threadpool(timed, "module_import", import_heavy_modules)
+        
+        # Initialize models with the configured provider
+        models["embedding"] = await run_in_threadpool(
+            timed, "embedding_model", get_embeddings_model, provider=MODEL_PROVIDER
+        )
+        models["llm"] = await run_in_threadpool(
+            timed, "llm_model", get_llm_model, provider=MODEL_PROVIDER
+        )
+        
+        # Try loading existing vector store for the current provider
+        shared_index = await run_in_threadpool(
+            timed, "vector_store", load_shared_index, models["embedding"], MODEL_PROVIDER
+        )
+        if shared_index.store:
+            print(f"Vector store loaded successfully (generation {shared_index.generation}).")
+        else:
+            print("No existing vector store found.")
+        
+        # Pick up index changes made by other workers without a restart
+        index_watcher = asyncio.create_task(shared_index.watch(models["embedding"]))
+        
+        startup_state["timings"]["ready_seconds"] = round(time.perf_counter() - APP_IMPORT_STARTED, 3)
+        process_age = process_age_seconds()
+        if process_age is not None:
+            startup_state["timings"]["cold_start_seconds"] = round(process_age, 3)
+        startup_state["status"] = "ready"
+        print(f"Warm-up complete: {startup_state['timings']}")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error during warm-up: {e}")
+        startup_state["status"] = "failed"
+        startup_state["error"] = str(e)
+
+async def wait_until_ready():
+    """Lets early requests wait for warm-up instead of failing; 503 if warm-up failed."""
+    if warmup_task is not None:
+        # Shield so a cancelled request doesn't cancel the shared warm-up
+        await asyncio.shield(warmup_task)
+    
+    if startup_state["status"] != "ready":
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service not ready: {startup_state['error'] or startup_state['status']}"
+        )
 
 @app.on_event("startup")
 async def startup_event():
-    global models, vector_store
-    import src.rag
+    global warmup_task
     from src.config import MODEL_PROVIDER
     
-    print(f"DEBUG: src.rag file: {src.rag.__file__}")
     print(f"Using MODEL_PROVIDER: {MODEL_PROVIDER}")
     
-    # Initialize models with the configured provider
-    models["embedding"] = get_embeddings_model(provider=MODEL_PROVIDER)
-    models["llm"] = get_llm_model(provider=MODEL_PROVIDER)
+    # Fast path: the app accepts requests immediately, models and index load in the background
+    startup_state["timings"]["startup_seconds"] = round(time.perf_counter() - APP_IMPORT_STARTED, 3)
+    warmup_task = asyncio.create_task(warm_up())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if warmup_task:
+        warmup_task.cancel()
+    if index_watcher:
+        index_watcher.cancel()
+
+@app.get("/health")
+async def health():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once model clients and the vector store are warmed up, 503 before.
+    Includes import, startup and warm-up timings.
+    """
+    from src.config import MODEL_PROVIDER
+    
+    body = {
+        "status": startup_state["status"],
+        "provider": MODEL_PROVIDER,
+        "generation": shared_index.generation if shared_index else None,
+        "timings": startup_state["timings"]
+    }
+    if startup_state["error"]:
+        body["error"] = startup_state["error"]
     
-    # Try loading existing vector store for the current provider
-    loaded_vs = load_vector_store(models["embedding"], provider=MODEL_PROVIDER)
-    if loaded_vs:
-        vector_store = loaded_vs
-        print("Vector store loaded successfully.")
-    else:
-        print("No existing vector store found.")
+    status_code = 200 if startup_state["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content=body)
 
 class QueryRequest(BaseModel):
     query: str
 
 @app.post("/ingest")
 async def ingest_document(file: UploadFile = File(...)):
-    global vector_store
     from src.config import MODEL_PROVIDER
-    from src.vector_store import add_documents_to_store
     
+    await wait_until_ready()
+    from src.document_loader import load_and_split_pdf, open_pdf
+    from src.vector_store import embed_chunks, add_embedded_documents_to_store
+    
+    temp_path = None
     try:
         # Get provider-specific upload directory
         upload_dir = get_upload_dir(provider=MODEL_PROVIDER)
-        file_path = os.path.join(upload_dir, file.filename)
+        os.makedirs(upload_dir, exist_ok=True)
+        filename = os.path.basename(file.filename or "")
+        if not filename or is_temp_upload(filename):
+            raise HTTPException(status_code=400, detail="Invalid filename.")
+        file_path = os.path.join(upload_dir, filename)
         
-        # Save file first
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Copy to a temp file while hashing, counting bytes and checking the PDF header
+        temp_path, sha256, size = await stream_upload_to_temp(file, upload_dir)
         
-        # Get file modification timestamp AFTER saving (Clock B)
-        stat = os.stat(file_path)
+        # Get file modification timestamp AFTER saving (Clock B) - preserved by the rename below
+        stat = os.stat(temp_path)
         uploaded_at = datetime.fromtimestamp(stat.st_mtime).isoformat()
         
-        print(f"Ingesting file: {file.filename} (provider: {MODEL_PROVIDER})")
+        print(f"Ingesting file: {filename} ({size} bytes, sha256 {sha256}) (provider: {MODEL_PROVIDER})")
         print(f"Using file timestamp: {uploaded_at}")
-        chunks = load_and_split_pdf(file_path, uploaded_at=uploaded_at)
+        
+        # Cheap validation (header, encryption, page count) before the full parse,
+        # then parse from the same open document instead of reading the file again.
+        # PyMuPDF work is blocking, so it runs in the threadpool to keep other requests responsive.
+        try:
+            pdf = await run_in_threadpool(open_pdf, temp_path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            chunks = await run_in_threadpool(load_and_split_pdf, file_path, uploaded_at=uploaded_at, pdf=pdf)
+        finally:
+            pdf.close()
         
         if not chunks:
              raise HTTPException(status_code=400, detail="No text found in PDF.")
 
         print(f"Created {len(chunks)} chunks from PDF.")
         
-        # Add to existing vector store instead of replacing
-        vector_store = add_documents_to_store(vector_store, chunks, models["embedding"])
-        save_vector_store(vector_store, provider=MODEL_PROVIDER)
+        # Atomically move the validated upload into place
+        commit_upload(temp_path, file_path)
+        temp_path = None
+        
+        # Embed before taking the writer lock, so slow embedding calls don't block other writers
+        embeddings = await run_in_threadpool(embed_chunks, chunks, models["embedding"])
+        
+        # Add to existing vector store instead of replacing (as the single writer across workers)
+        await run_in_threadpool(
+            shared_index.update,
+            models["embedding"],
+            lambda store: add_embedded_documents_to_store(store, chunks, embeddings, models["embedding"])
+        )
         print("Documents added to vector store and saved successfully.")
         
         return {
             "message": "Document ingested and added to vector store successfully.",
             "chunks": len(chunks),
-            "uploaded_at": uploaded_at
+            "uploaded_at": uploaded_at,
+            "size": size,
+            "sha256": sha256
         }
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error executing ingest: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        discard_temp_upload(temp_path)
 
 @app.post("/chat")
 async def chat(request: QueryRequest):
-    global vector_store
     from src.config import MODEL_PROVIDER
     
+    await wait_until_ready()
+    from src.rag import create_rag_chain
+    
+    vector_store = shared_index.store
     if not vector_store:
         raise HTTPException(status_code=400, detail="No documents ingested yet.")
     
@@ -138,8 +318,8 @@ async def get_documents():
         for filename in os.listdir(upload_dir):
             file_path = os.path.join(upload_dir, filename)
             
-            # Skip directories
-            if os.path.isdir(file_path):
+            # Skip directories and in-flight uploads
+            if os.path.isdir(file_path) or is_temp_upload(filename):
                 continue
             
             # Get file stats (Clock B - filesystem time)
@@ -210,8 +390,9 @@ async def delete_document(filename: str, uploaded_at: str):
     Query parameters:
         uploaded_at: ISO format timestamp of when the file was uploaded
     """
-    global vector_store
     from src.config import MODEL_PROVIDER
+    
+    await wait_until_ready()
     from src.vector_store import delete_document_from_store
     
     try:
@@ -222,25 +403,17 @@ async def delete_document(filename: str, uploaded_at: str):
         if not os.path.abspath(file_path).startswith(os.path.abspath(upload_dir)):
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Delete from vector store first
+        # Delete from vector store first (as the single writer across workers).
+        # If no documents remain, an empty generation is published instead.
+        vector_store = await run_in_threadpool(
+            shared_index.update,
+            models["embedding"],
+            lambda store: delete_document_from_store(store, filename, uploaded_at)
+        )
         if vector_store:
-            vector_store = delete_document_from_store(
-                vector_store,
-                filename,
-                uploaded_at,
-                models["embedding"]
-            )
-            
-            # Save updated vector store (or delete if empty)
-            if vector_store:
-                save_vector_store(vector_store, provider=MODEL_PROVIDER)
-                print(f"Vector store updated after deleting {filename}")
-            else:
-                # If no documents remain, delete the vector store directory
-                store_path = get_vector_store_path(provider=MODEL_PROVIDER)
-                if os.path.exists(store_path):
-                    shutil.rmtree(store_path)
-                    print("Vector store deleted (no documents remaining)")
+            print(f"Vector store updated after deleting {filename}")
+        else:
+            print("Vector store cleared (no documents remaining)")
         
         # Delete the physical file
         if os.path.exists(file_path):
@@ -271,4 +444,6 @@ def format_file_size(size_bytes):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from src.config import WORKERS
+    # Multiple workers need the app as an import string
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WORKERS)
@@ -31,6 +31,17 @@ UPLOAD_DIR_OPENAI = "uploads_openai"
 VECTOR_STORE_PATH = VECTOR_STORE_PATH_OLLAMA
 UPLOAD_DIR = UPLOAD_DIR_OLLAMA
 
+# Upload limits (override via environment variables)
+MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "50"))
+MAX_UPLOAD_SIZE_BYTES = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "2000"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Copy uploads to disk in 1 MB chunks
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Allowance for multipart boundaries and headers on top of the file size
+
+# Multi-worker deployment (override via environment variables)
+WORKERS = int(os.getenv("WORKERS", "1"))  # Number of uvicorn worker processes
+INDEX_POLL_INTERVAL_SECONDS = float(os.getenv("INDEX_POLL_INTERVAL_SECONDS", "2"))  # How often workers check for a newer index
+
 def get_vector_store_path(provider=None):
     """Get the appropriate vector store path based on provider."""
     if provider is None:
@@ -54,7 +65,3 @@ def get_upload_dir(provider=None):
         return UPLOAD_DIR_OLLAMA
     else:
         return UPLOAD_DIR_OLLAMA  # Default to Ollama
-
-# Create directories if they don't exist
-os.makedirs(UPLOAD_DIR_OLLAMA, exist_ok=True)
-os.makedirs(UPLOAD_DIR_OPENAI, exist_ok=True)
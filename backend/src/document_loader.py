@@ -4,8 +4,88 @@ from typing import List
 from langchain_core.documents import Document
 import os
 from datetime import datetime
+from .config import MAX_PDF_PAGES
 
-def load_and_split_pdf(file_path: str, uploaded_at: str = None) -> List[Document]:
+def open_pdf(file_path: str, max_pages: int = None):
+    """
+    Opens a PDF with PyMuPDF and validates it before any text is extracted.
+    Opening only reads the cross-reference table, so this is cheap even for large files.
+
+    Args:
+        file_path: Path to the PDF file
+        max_pages: Maximum number of pages allowed. If None, uses MAX_PDF_PAGES from config.
+
+    Returns:
+        Open pymupdf.Document (caller is responsible for closing it)
+
+    Raises:
+        ValueError: If the file is not a readable PDF, is encrypted, is empty or has too many pages
+    """
+    import pymupdf
+
+    if max_pages is None:
+        max_pages = MAX_PDF_PAGES
+
+    try:
+        pdf = pymupdf.open(file_path, filetype="pdf")
+    except Exception as e:
+        raise ValueError(f"Invalid PDF file: {e}")
+
+    try:
+        if pdf.needs_pass:
+            raise ValueError("Encrypted PDFs are not supported.")
+        if pdf.page_count == 0:
+            raise ValueError("PDF has no pages.")
+        if pdf.page_count > max_pages:
+            raise ValueError(f"PDF has {pdf.page_count} pages, the maximum is {max_pages}.")
+    except ValueError:
+        pdf.close()
+        raise
+
+    return pdf
+
+def _pdf_metadata(pdf, file_path: str) -> dict:
+    """Document-level metadata in the same shape PyMuPDFLoader produces."""
+    metadata = {
+        "producer": "PyMuPDF",
+        "creator": "PyMuPDF",
+        "creationdate": "",
+        "source": file_path,
+        "file_path": file_path,
+        "total_pages": pdf.page_count,
+    }
+    for key, value in pdf.metadata.items():
+        if not isinstance(value, (str, int)):
+            continue
+        
+        normalized_key = key.lower()
+        if normalized_key in ("creationdate", "moddate"):
+            try:
+                metadata[normalized_key] = datetime.strptime(
+                    value.replace("'", ""), "D:%Y%m%d%H%M%S%z"
+                ).isoformat("T")
+            except ValueError:
+                metadata[normalized_key] = value
+            # The loader also keeps the raw PDF date strings
+            metadata[key] = value
+        elif isinstance(value, str):
+            metadata[normalized_key] = value.strip()
+        else:
+            metadata[normalized_key] = value
+    return metadata
+
+def _load_pages(pdf, file_path: str) -> List[Document]:
+    """Extracts one Document per page from an already open PDF."""
+    metadata = _pdf_metadata(pdf, file_path)
+    return [
+        Document(
+            page_content=page.get_text(),
+            metadata={**metadata, "page": page_number}
+        )
+        for page_number, page in enumerate(pdf)
+    ]
+
+def load_and_split_pdf(file_path: str, uploaded_at: str = None, pdf=None) -> List[Document]:
     """
     Loads a PDF file and splits it into chunks.
     Adds metadata with source filename and upload timestamp for tracking.
@@ -13,9 +93,14 @@ def load_and_split_pdf(file_path: str, uploaded_at: str = None) -> List[Document
     Args:
         file_path: Path to the PDF file
         uploaded_at: ISO format timestamp of when file was uploaded
+        pdf: Already open pymupdf.Document (from open_pdf) to reuse instead of opening file_path again.
+             file_path is then only used for metadata.
     """
-    loader = PyMuPDFLoader(file_path)
-    docs = loader.load()
+    if pdf is not None:
+        docs = _load_pages(pdf, file_path)
+    else:
+        loader = PyMuPDFLoader(file_path)
+        docs = loader.load()
     
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from .config import MODEL_PROVIDER, INDEX_POLL_INTERVAL_SECONDS
+from .vector_store import (
+    read_index_generation,
+    load_latest_vector_store,
+    save_vector_store,
+    clear_vector_store,
+    index_write_lock
+)
+
+class SharedVectorStore:
+    """
+    Keeps this worker's copy of the vector store in sync with the persisted index.
+
+    Every uvicorn worker holds one of these. Writes go through update(), which takes the
+    cross-process writer lock, so only one worker writes at a time and always on top of the
+    latest generation. Other workers notice the new generation in the manifest and reload
+    it in the background while they keep serving the copy they have.
+
+    The store being served is never modified in place: updates are applied to a private
+    copy and only swapped in once they have been saved and published.
+    """
+
+    def __init__(self, provider=None):
+        self.provider = provider or MODEL_PROVIDER
+        self.store = None
+        self.generation = -1
+        self._lock = threading.Lock()
+
+    def _install(self, store, generation: int):
+        # Never go backwards if a slow background reload finishes after a newer write
+        with self._lock:
+            if generation > self.generation:
+                self.store = store
+                self.generation = generation
+
+    def is_stale(self) -> bool:
+        """Cheap check: has another worker published a newer generation?"""
+        return read_index_generation(self.provider) > self.generation
+
+    def refresh(self, embedding_model) -> bool:
+        """
+        Reloads the index from disk if a newer generation exists.
+
+        Returns:
+            True if a new generation was loaded
+        """
+        if not self.is_stale():
+            return False
+
+        store, generation = load_latest_vector_store(embedding_model, provider=self.provider)
+        self._install(store, generation)
+        return True
+
+    def update(self, embedding_model, mutate):
+        """
+        Applies a change to the index as the single writer and publishes it to all workers.
+
+        Args:
+            embedding_model: Embedding model used to load the latest generation
+            mutate: Function taking the current store (or None) and returning the new store (or None).
+                It runs while every other writer waits, so it must be cheap: compute embeddings
+                beforehand and only add or remove vectors here.
+
+        Returns:
+            The new vector store, or None if no documents remain
+        """
+        with index_write_lock(self.provider):
+            # Work on a private copy of the latest generation, so writes from other workers
+            # are not lost and requests searching self.store never see a half-applied change
+            current_store, _ = load_latest_vector_store(embedding_model, provider=self.provider)
+
+            new_store = mutate(current_store)
+            if new_store is None and current_store is None:
+                return None
+
+            # If saving fails nothing is installed, so this worker keeps serving what is on disk
+            if new_store is None:
+                generation = clear_vector_store(provider=self.provider)
+            else:
+                generation = save_vector_store(new_store, provider=self.provider)
+
+            self._install(new_store, generation)
+            return new_store
+
+    async def watch(self, embedding_model, interval: float = None):
+        """
+        Background task polling the manifest and hot-reloading newer generations.
+        Loading runs in a thread so requests keep being served during the reload.
+        """
+        if interval is None:
+            interval = INDEX_POLL_INTERVAL_SECONDS
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.is_stale():
+                    await asyncio.get_running_loop().run_in_executor(None, self.refresh, embedding_model)
+                    print(f"Vector store reloaded (generation {self.generation}).")
+            except Exception as e:
+                # Usually a generation pruned mid-load; the next poll picks up the latest one
+                print(f"Error reloading vector store: {e}")
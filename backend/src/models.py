@@ -1,4 +1,3 @@
-from langchain_ollama import OllamaEmbeddings, ChatOllama
 from .config import (
     MODEL_PROVIDER,
     OLLAMA_LLM_MODEL, 
@@ -41,6 +40,8 @@ def get_embeddings_model(provider=None):
         )
     
     elif provider.lower() == "ollama":
+        # Imported here so only the selected provider's SDK is loaded
+        from langchain_ollama import OllamaEmbeddings
         return OllamaEmbeddings(model=OLLAMA_EMBEDDING_MODEL)
     
     else:
@@ -82,6 +83,8 @@ def get_llm_model(provider=None):
         )
     
     elif provider.lower() == "ollama":
+        # Imported here so only the selected provider's SDK is loaded
+        from langchain_ollama import ChatOllama
         return ChatOllama(model=OLLAMA_LLM_MODEL)
     
     else:
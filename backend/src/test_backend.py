@@ -2,13 +2,31 @@ import unittest
 from unittest.mock import MagicMock, patch
 import sys
 import os
+import asyncio
+import hashlib
+import io
+import subprocess
+import tempfile
+import threading
+import time
 
 # Add backend directory to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from src.document_loader import load_and_split_pdf
+from src.document_loader import load_and_split_pdf, open_pdf
 from src.vector_store import create_vector_store
 from src.rag import create_rag_chain
+from src.upload_handler import stream_upload_to_temp, UploadRejected, UploadSizeLimitMiddleware
+from src.vector_store import (
+    save_vector_store,
+    clear_vector_store,
+    read_index_generation,
+    read_index_manifest,
+    embed_chunks,
+    add_embedded_documents_to_store,
+    delete_document_from_store
+)
+from src.index_sync import SharedVectorStore
 from langchain_core.documents import Document
 
 class TestBackend(unittest.TestCase):
@@ -52,5 +70,448 @@ class TestBackend(unittest.TestCase):
         self.assertIsNotNone(chain)
         print("test_rag_chain_creation passed!")
 
+class FakeUpload:
+    """Minimal stand-in for FastAPI's UploadFile."""
+
+    def __init__(self, data):
+        self.file = io.BytesIO(data)
+
+class TestUploadHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_stream_upload_hashes_and_counts(self):
+        data = b"%PDF-1.7\n" + b"x" * 5000
+        
+        temp_path, sha256, size = asyncio.run(
+            stream_upload_to_temp(FakeUpload(data), self.tmp_dir.name, chunk_size=1024)
+        )
+        
+        self.assertEqual(size, len(data))
+        self.assertEqual(sha256, hashlib.sha256(data).hexdigest())
+        with open(temp_path, "rb") as f:
+            self.assertEqual(f.read(), data)
+        print("test_stream_upload_hashes_and_counts passed!")
+
+    def test_stream_upload_rejects_non_pdf(self):
+        with self.assertRaises(UploadRejected) as ctx:
+            asyncio.run(stream_upload_to_temp(FakeUpload(b"not a pdf"), self.tmp_dir.name))
+        
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+        print("test_stream_upload_rejects_non_pdf passed!")
+
+    def test_stream_upload_enforces_max_size(self):
+        data = b"%PDF-1.7\n" + b"x" * 5000
+        
+        with self.assertRaises(UploadRejected) as ctx:
+            asyncio.run(
+                stream_upload_to_temp(FakeUpload(data), self.tmp_dir.name, max_bytes=2048, chunk_size=1024)
+            )
+        
+        self.assertEqual(ctx.exception.status_code, 413)
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+        print("test_stream_upload_enforces_max_size passed!")
+
+class FakeStore:
+    """Stand-in for a FAISS store that only knows how to save itself."""
+
+    def save_local(self, path):
+        os.makedirs(path)
+
+SAMPLE_PDF = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "..", "rag-dataset", "gym supplements", "1. Analysis of Actual Fitness Supplement.pdf"
+))
+
+class TestPdfValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_open_pdf_accepts_valid_pdf(self):
+        pdf = open_pdf(SAMPLE_PDF)
+        self.addCleanup(pdf.close)
+        
+        self.assertEqual(pdf.page_count, 15)
+        print("test_open_pdf_accepts_valid_pdf passed!")
+
+    def test_open_pdf_rejects_encrypted_pdf(self):
+        import pymupdf
+        
+        file_path = os.path.join(self.tmp_dir.name, "encrypted.pdf")
+        pdf = pymupdf.open()
+        pdf.new_page()
+        pdf.save(file_path, encryption=pymupdf.PDF_ENCRYPT_AES_256, user_pw="user", owner_pw="owner")
+        pdf.close()
+        
+        with self.assertRaisesRegex(ValueError, "Encrypted"):
+            open_pdf(file_path)
+        print("test_open_pdf_rejects_encrypted_pdf passed!")
+
+    def test_open_pdf_rejects_pdf_without_pages(self):
+        file_path = os.path.join(self.tmp_dir.name, "empty.pdf")
+        with open(file_path, "wb") as f:
+            f.write(
+                b"%PDF-1.4\n"
+                b"1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+                b"2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\n"
+                b"trailer<</Root 1 0 R>>\n%%EOF\n"
+            )
+        
+        with self.assertRaisesRegex(ValueError, "no pages"):
+            open_pdf(file_path)
+        print("test_open_pdf_rejects_pdf_without_pages passed!")
+
+    def test_open_pdf_rejects_too_many_pages(self):
+        with self.assertRaisesRegex(ValueError, "maximum is 10"):
+            open_pdf(SAMPLE_PDF, max_pages=10)
+        print("test_open_pdf_rejects_too_many_pages passed!")
+
+    def test_open_pdf_rejects_garbage(self):
+        file_path = os.path.join(self.tmp_dir.name, "garbage.pdf")
+        with open(file_path, "wb") as f:
+            f.write(b"%PDF-1.7\n" + b"not really a pdf")
+        
+        with self.assertRaises(ValueError):
+            open_pdf(file_path)
+        print("test_open_pdf_rejects_garbage passed!")
+
+    def test_open_pdf_path_matches_loader_path(self):
+        from_loader = load_and_split_pdf(SAMPLE_PDF, uploaded_at="2025-01-01T00:00:00")
+        pdf = open_pdf(SAMPLE_PDF)
+        try:
+            from_open_pdf = load_and_split_pdf(SAMPLE_PDF, uploaded_at="2025-01-01T00:00:00", pdf=pdf)
+        finally:
+            pdf.close()
+        
+        self.assertEqual(len(from_open_pdf), len(from_loader))
+        for expected, actual in zip(from_loader, from_open_pdf):
+            self.assertEqual(actual.page_content, expected.page_content)
+            self.assertEqual(actual.metadata, expected.metadata)
+        print("test_open_pdf_path_matches_loader_path passed!")
+
+class TestUploadSizeLimit(unittest.TestCase):
+
+    def setUp(self):
+        from fastapi import FastAPI, UploadFile, File
+        from fastapi.testclient import TestClient
+        
+        app = FastAPI()
+        app.add_middleware(UploadSizeLimitMiddleware, paths=("/ingest",), max_body_bytes=4096)
+        
+        @app.post("/ingest")
+        async def ingest(file: UploadFile = File(...)):
+            return {"size": file.size}
+        
+        self.client = TestClient(app)
+
+    def test_accepts_small_upload(self):
+        response = self.client.post("/ingest", files={"file": ("a.pdf", b"x" * 100)})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"size": 100})
+        print("test_accepts_small_upload passed!")
+
+    def test_rejects_on_content_length(self):
+        response = self.client.post("/ingest", files={"file": ("a.pdf", b"x" * 10000)})
+        
+        self.assertEqual(response.status_code, 413)
+        print("test_rejects_on_content_length passed!")
+
+    def test_rejection_carries_cors_headers(self):
+        from fastapi.testclient import TestClient
+        from src.config import MAX_UPLOAD_SIZE_BYTES, MULTIPART_OVERHEAD_BYTES
+        import main
+        
+        # The real app, so the middleware order is the one that ships.
+        # Not entering the client context skips warm-up, which this request never needs.
+        client = TestClient(main.app)
+        response = client.post(
+            "/ingest",
+            content=b"x" * (MAX_UPLOAD_SIZE_BYTES + MULTIPART_OVERHEAD_BYTES + 1),
+            headers={
+                "content-type": "multipart/form-data; boundary=b",
+                "origin": "http://localhost:5173"
+            }
+        )
+        
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("access-control-allow-origin", response.headers)
+        print("test_rejection_carries_cors_headers passed!")
+
+    def test_rejects_chunked_body_while_receiving(self):
+        def body():
+            yield b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.pdf"\r\n\r\n'
+            for _ in range(10):
+                yield b"x" * 1000
+            yield b"\r\n--b--\r\n"
+        
+        # A generator body is sent without Content-Length
+        response = self.client.post(
+            "/ingest",
+            content=body(),
+            headers={"content-type": "multipart/form-data; boundary=b"}
+        )
+        
+        self.assertEqual(response.status_code, 413)
+        print("test_rejects_chunked_body_while_receiving passed!")
+
+class TestIndexSync(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        store_path = os.path.join(self.tmp_dir.name, "vector_store_index_test")
+        patcher = patch("src.vector_store.get_vector_store_path", return_value=store_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store_path = store_path
+
+    def test_save_publishes_new_generations(self):
+        self.assertEqual(read_index_generation("test"), 0)
+        
+        save_vector_store(FakeStore(), provider="test")
+        save_vector_store(FakeStore(), provider="test")
+        save_vector_store(FakeStore(), provider="test")
+        
+        self.assertEqual(read_index_generation("test"), 3)
+        # Older generations are pruned, the previous one is kept for slow readers
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.store_path) if name.startswith("gen-")),
+            ["gen-000002", "gen-000003"]
+        )
+        
+        clear_vector_store(provider="test")
+        self.assertEqual(read_index_generation("test"), 4)
+        print("test_save_publishes_new_generations passed!")
+
+    def test_corrupt_manifest_falls_back_to_newest_generation(self):
+        for generation in (1, 2):
+            os.makedirs(os.path.join(self.store_path, f"gen-00000{generation}"))
+            for name in ("index.faiss", "index.pkl"):
+                with open(os.path.join(self.store_path, f"gen-00000{generation}", name), "wb") as f:
+                    f.write(b"index")
+        # Incomplete generation left behind by a crash mid-save
+        os.makedirs(os.path.join(self.store_path, "gen-000003"))
+        with open(os.path.join(self.store_path, "manifest.json"), "w") as f:
+            f.write('{"generation": 2, "pa')
+        
+        self.assertEqual(read_index_manifest("test"), {"generation": 2, "path": "gen-000002"})
+        
+        # The next save repairs the manifest
+        save_vector_store(FakeStore(), provider="test")
+        self.assertEqual(read_index_manifest("test"), {"generation": 3, "path": "gen-000003"})
+        print("test_corrupt_manifest_falls_back_to_newest_generation passed!")
+
+    def test_corrupt_manifest_without_generations_is_a_clear_error(self):
+        os.makedirs(self.store_path)
+        with open(os.path.join(self.store_path, "manifest.json"), "w") as f:
+            f.write("")
+        
+        with self.assertRaisesRegex(ValueError, "Corrupt index manifest"):
+            read_index_manifest("test")
+        print("test_corrupt_manifest_without_generations_is_a_clear_error passed!")
+
+    def test_first_save_removes_legacy_index(self):
+        os.makedirs(self.store_path)
+        for name in ("index.faiss", "index.pkl"):
+            with open(os.path.join(self.store_path, name), "wb") as f:
+                f.write(b"legacy")
+        self.assertEqual(read_index_generation("test"), 0)
+        
+        save_vector_store(FakeStore(), provider="test")
+        
+        self.assertEqual(read_index_generation("test"), 1)
+        self.assertEqual(sorted(os.listdir(self.store_path)), ["gen-000001", "manifest.json"])
+        print("test_first_save_removes_legacy_index passed!")
+
+    @patch("src.vector_store.FAISS")
+    def test_workers_see_each_others_writes(self, MockFAISS):
+        MockFAISS.load_local.side_effect = lambda path, *args, **kwargs: os.path.basename(path)
+        writer = SharedVectorStore(provider="test")
+        reader = SharedVectorStore(provider="test")
+        writer.refresh(MagicMock())
+        reader.refresh(MagicMock())
+        
+        writer.update(MagicMock(), lambda store: FakeStore())
+        
+        self.assertTrue(reader.is_stale())
+        self.assertTrue(reader.refresh(MagicMock()))
+        self.assertEqual(reader.store, "gen-000001")
+        self.assertFalse(reader.refresh(MagicMock()))
+        
+        # A write from the reader builds on the latest generation
+        seen = []
+        reader.update(MagicMock(), lambda store: seen.append(store) or None)
+        self.assertEqual(seen, ["gen-000001"])
+        self.assertIsNone(reader.store)
+        self.assertTrue(writer.refresh(MagicMock()))
+        self.assertIsNone(writer.store)
+        print("test_workers_see_each_others_writes passed!")
+
+    @patch("src.vector_store.FAISS")
+    def test_update_never_mutates_served_store(self, MockFAISS):
+        MockFAISS.load_local.side_effect = lambda *args, **kwargs: MagicMock()
+        worker = SharedVectorStore(provider="test")
+        worker.update(MagicMock(), lambda store: FakeStore())
+        worker.refresh(MagicMock())
+        served = worker.store
+        
+        seen = []
+        worker.update(MagicMock(), lambda store: seen.append(store) or FakeStore())
+        
+        # The change was applied to a private copy loaded from disk
+        self.assertIsNot(seen[0], served)
+        self.assertEqual(worker.generation, 2)
+        print("test_update_never_mutates_served_store passed!")
+
+    @patch("src.vector_store.FAISS")
+    def test_failed_publish_keeps_served_store(self, MockFAISS):
+        MockFAISS.load_local.side_effect = lambda *args, **kwargs: MagicMock()
+        worker = SharedVectorStore(provider="test")
+        worker.update(MagicMock(), lambda store: FakeStore())
+        served = worker.store
+        
+        with patch("src.vector_store._publish_generation", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                worker.update(MagicMock(), lambda store: FakeStore())
+        
+        self.assertIs(worker.store, served)
+        self.assertEqual(worker.generation, 1)
+        self.assertEqual(read_index_generation("test"), 1)
+        # The half-written generation is cleaned up
+        self.assertFalse(os.path.exists(os.path.join(self.store_path, "gen-000002")))
+        print("test_failed_publish_keeps_served_store passed!")
+
+    @patch("src.vector_store.FAISS")
+    def test_load_retries_when_generation_is_pruned(self, MockFAISS):
+        save_vector_store(FakeStore(), provider="test")
+        
+        def load_local(path, *args, **kwargs):
+            if path.endswith("gen-000001"):
+                # A writer publishes a newer generation and prunes this one mid-load
+                save_vector_store(FakeStore(), provider="test")
+                save_vector_store(FakeStore(), provider="test")
+                raise RuntimeError("could not open index.faiss")
+            return os.path.basename(path)
+        MockFAISS.load_local.side_effect = load_local
+        
+        worker = SharedVectorStore(provider="test")
+        self.assertTrue(worker.refresh(MagicMock()))
+        
+        self.assertEqual(worker.store, "gen-000003")
+        self.assertEqual(worker.generation, 3)
+        print("test_load_retries_when_generation_is_pruned passed!")
+
+    @patch("src.vector_store.FAISS")
+    def test_load_error_on_current_generation_is_raised(self, MockFAISS):
+        save_vector_store(FakeStore(), provider="test")
+        MockFAISS.load_local.side_effect = RuntimeError("corrupt index")
+        
+        with self.assertRaises(RuntimeError):
+            SharedVectorStore(provider="test").refresh(MagicMock())
+        print("test_load_error_on_current_generation_is_raised passed!")
+
+    def test_concurrent_writers_do_not_lose_updates(self):
+        from langchain_core.embeddings import FakeEmbeddings
+        
+        embedding_model = FakeEmbeddings(size=8)
+        active_writers = []
+        max_active_writers = []
+        
+        def ingest(name):
+            chunks = [Document(page_content=name, metadata={"source": name, "uploaded_at": "t"})]
+            # Embeddings are computed before taking the writer lock
+            embeddings = embed_chunks(chunks, embedding_model)
+            
+            def mutate(store):
+                active_writers.append(name)
+                max_active_writers.append(len(active_writers))
+                time.sleep(0.1)
+                store = add_embedded_documents_to_store(store, chunks, embeddings, embedding_model)
+                active_writers.remove(name)
+                return store
+            
+            SharedVectorStore(provider="test").update(embedding_model, mutate)
+        
+        writers = [threading.Thread(target=ingest, args=(name,)) for name in ("a.pdf", "b.pdf")]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        
+        # Writers took turns, and the second one built on the first one's generation
+        self.assertEqual(max(max_active_writers), 1)
+        reader = SharedVectorStore(provider="test")
+        reader.refresh(embedding_model)
+        self.assertEqual(reader.generation, 2)
+        self.assertEqual(
+            sorted(doc.metadata["source"] for doc in reader.store.docstore._dict.values()),
+            ["a.pdf", "b.pdf"]
+        )
+        print("test_concurrent_writers_do_not_lose_updates passed!")
+
+class TestVectorStoreEdits(unittest.TestCase):
+
+    def setUp(self):
+        from langchain_core.embeddings import FakeEmbeddings
+        
+        self.embedding_model = FakeEmbeddings(size=8)
+        self.chunks = [
+            Document(page_content=f"chunk {i}", metadata={"source": source, "uploaded_at": "t"})
+            for i, source in enumerate(["a.pdf", "a.pdf", "b.pdf"])
+        ]
+        embeddings = embed_chunks(self.chunks, self.embedding_model)
+        self.store = add_embedded_documents_to_store(None, self.chunks, embeddings, self.embedding_model)
+
+    def test_add_embedded_documents_does_not_embed_again(self):
+        embedding_model = MagicMock()
+        embedding_model.embed_documents.side_effect = AssertionError("should not embed")
+        extra = [Document(page_content="extra", metadata={"source": "c.pdf", "uploaded_at": "t"})]
+        
+        store = add_embedded_documents_to_store(self.store, extra, [[0.0] * 8], embedding_model)
+        
+        self.assertEqual(store.index.ntotal, 4)
+        print("test_add_embedded_documents_does_not_embed_again passed!")
+
+    def test_delete_removes_only_matching_vectors(self):
+        store = delete_document_from_store(self.store, "a.pdf", "t")
+        
+        self.assertEqual(store.index.ntotal, 1)
+        remaining = [store.docstore.search(doc_id) for doc_id in store.index_to_docstore_id.values()]
+        self.assertEqual([doc.page_content for doc in remaining], ["chunk 2"])
+        print("test_delete_removes_only_matching_vectors passed!")
+
+    def test_delete_last_document_returns_none(self):
+        store = delete_document_from_store(self.store, "a.pdf", "t")
+        
+        self.assertIsNone(delete_document_from_store(store, "b.pdf", "t"))
+        print("test_delete_last_document_returns_none passed!")
+
+class TestColdStart(unittest.TestCase):
+
+    def test_app_import_defers_heavy_modules(self):
+        backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        script = (
+            "import sys, main; "
+            "print(','.join(m for m in ('langchain_ollama', 'langchain_openai', 'langchain_community', 'faiss') "
+            "if m in sys.modules))"
+        )
+        
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=backend_dir,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        
+        # Provider SDKs, LangChain loaders and FAISS are only loaded during warm-up
+        self.assertEqual(result.stdout.strip(), "")
+        print("test_app_import_defers_heavy_modules passed!")
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import tempfile
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from .config import MAX_UPLOAD_SIZE_BYTES, UPLOAD_CHUNK_SIZE, MULTIPART_OVERHEAD_BYTES
+
+# Every PDF starts with this marker (readers accept it within the first 1 KB)
+PDF_MAGIC = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+
+# Partially written uploads are hidden dotfiles so they never show up in listings
+TEMP_PREFIX = ".upload-"
+TEMP_SUFFIX = ".part"
+
+class UploadRejected(Exception):
+    """Raised when an upload is refused before it reaches the parser."""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+class UploadSizeLimitMiddleware:
+    """
+    Caps the request body of upload endpoints before the multipart form is parsed.
+
+    FastAPI spools the whole multipart body to its own temp file before the handler
+    runs, so limits checked in the handler come too late. This middleware rejects
+    requests whose Content-Length is over the limit up front, and aborts bodies sent
+    without one (e.g. chunked) as soon as the received bytes go over the limit.
+    """
+
+    def __init__(self, app, paths=("/ingest",), max_body_bytes: int = None):
+        self.app = app
+        self.paths = set(paths)
+        if max_body_bytes is None:
+            # Leave room for the multipart boundaries and part headers around the file
+            max_body_bytes = MAX_UPLOAD_SIZE_BYTES + MULTIPART_OVERHEAD_BYTES
+        self.max_body_bytes = max_body_bytes
+
+    def _too_large_detail(self) -> str:
+        return f"File exceeds the maximum upload size of {MAX_UPLOAD_SIZE_BYTES // (1024 * 1024)} MB."
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            try:
+                too_large = int(content_length) > self.max_body_bytes
+            except ValueError:
+                response = JSONResponse(status_code=400, content={"detail": "Invalid Content-Length header."})
+                await response(scope, receive, send)
+                return
+            if too_large:
+                response = JSONResponse(status_code=413, content={"detail": self._too_large_detail()})
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing as-is
+                    raise HTTPException(status_code=413, detail=self._too_large_detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def is_temp_upload(filename: str) -> bool:
+    """Returns True for in-flight upload files that should not be listed."""
+    return filename.startswith(TEMP_PREFIX)
+
+def copy_upload_to_temp(source, upload_dir: str, max_bytes: int = None, chunk_size: int = None):
+    """
+    Copies an uploaded file into a temporary file inside the upload directory.
+    The SHA-256 hash and byte count are computed while copying, the PDF header is
+    checked on the first chunk and the exact size limit is enforced as bytes are
+    copied, so bogus or oversized uploads never reach the upload directory.
+
+    This is blocking (hashing and disk writes); async callers should use
+    stream_upload_to_temp, which runs it in the threadpool.
+
+    Args:
+        source: Binary file object to read from (e.g. UploadFile.file)
+        upload_dir: Directory the file will eventually be renamed into
+        max_bytes: Maximum accepted size in bytes. If None, uses MAX_UPLOAD_SIZE_BYTES.
+        chunk_size: Read size in bytes. If None, uses UPLOAD_CHUNK_SIZE.
+
+    Returns:
+        Tuple of (temp_path, sha256 hex digest, size in bytes)
+    """
+    if max_bytes is None:
+        max_bytes = MAX_UPLOAD_SIZE_BYTES
+    if chunk_size is None:
+        chunk_size = UPLOAD_CHUNK_SIZE
+
+    # Temp file lives in the target directory so the final rename is atomic
+    fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=TEMP_SUFFIX, dir=upload_dir)
+    sha256 = hashlib.sha256()
+    size = 0
+
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            header_checked = False
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+
+                if not header_checked:
+                    if PDF_MAGIC not in chunk[:PDF_HEADER_WINDOW]:
+                        raise UploadRejected("Uploaded file is not a PDF.")
+                    header_checked = True
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(
+                        f"File exceeds the maximum upload size of {max_bytes // (1024 * 1024)} MB.",
+                        status_code=413
+                    )
+
+                sha256.update(chunk)
+                buffer.write(chunk)
+
+        if size == 0:
+            raise UploadRejected("Uploaded file is empty.")
+    except BaseException:
+        discard_temp_upload(temp_path)
+        raise
+
+    return temp_path, sha256.hexdigest(), size
+
+async def stream_upload_to_temp(upload_file, upload_dir: str, max_bytes: int = None, chunk_size: int = None):
+    """
+    Copies a FastAPI UploadFile into a temporary file in the threadpool (see copy_upload_to_temp),
+    so hashing and writing a large upload doesn't stall other requests.
+
+    By the time this runs FastAPI has already received the multipart body (capped
+    by UploadSizeLimitMiddleware), so this is the second copy of the file.
+
+    Returns:
+        Tuple of (temp_path, sha256 hex digest, size in bytes)
+    """
+    return await run_in_threadpool(copy_upload_to_temp, upload_file.file, upload_dir, max_bytes, chunk_size)
+
+def commit_upload(temp_path: str, final_path: str):
+    """
+    Atomically moves a fully written upload into place.
+    The modification time is preserved, so timestamps taken from the temp file stay valid.
+    """
+    os.replace(temp_path, final_path)
+
+def discard_temp_upload(temp_path: str):
+    """Removes a temporary upload file if it still exists."""
+    if temp_path and os.path.exists(temp_path):
+        os.remove(temp_path)
@@ -2,9 +2,21 @@ from langchain_community.vectorstores import FAISS
 from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_core.documents import Document
 from typing import List, Optional
+from contextlib import contextmanager
+import json
 import os
+import shutil
 from .config import get_vector_store_path, MODEL_PROVIDER
 
+# Persisted layout (shared by all workers):
+#   <store_path>/manifest.json   -> {"generation": N, "path": "gen-00000N"} (path is null when empty)
+#   <store_path>/gen-00000N/     -> FAISS index written by save_local
+#   <store_path>.lock            -> cross-process writer lock
+MANIFEST_FILE = "manifest.json"
+KEEP_GENERATIONS = 2  # Keep the previous generation around for workers still loading it
+LOAD_ATTEMPTS = 5  # Retries when a generation is pruned while it is being loaded
+LEGACY_INDEX_FILES = ("index.faiss", "index.pkl")  # Index saved at the store root before generations existed
+
 def create_vector_store(chunks: List[Document], embedding_model):
     """
     Creates a FAISS vector store from document chunks.
@@ -36,99 +48,331 @@ def add_documents_to_store(vector_store: FAISS, chunks: List[Document], embeddin
     vector_store.add_documents(chunks)
     return vector_store
 
-def delete_document_from_store(vector_store: FAISS, filename: str, uploaded_at: str, embedding_model) -> Optional[FAISS]:
+def embed_chunks(chunks: List[Document], embedding_model) -> List[List[float]]:
+    """
+    Computes embeddings for document chunks.
+    This is the slow part of ingestion, so it runs before taking the index write lock.
+    """
+    return embedding_model.embed_documents([chunk.page_content for chunk in chunks])
+
+def add_embedded_documents_to_store(vector_store: Optional[FAISS], chunks: List[Document], embeddings: List[List[float]], embedding_model):
     """
-    Deletes a document from the vector store by filtering out chunks with matching source and uploaded_at.
+    Adds chunks with precomputed embeddings to a FAISS vector store, without calling the embedding model.
     
     Args:
-        vector_store: Existing FAISS vector store
+        vector_store: Existing FAISS vector store, or None to create a new one
+        chunks: New document chunks to add
+        embeddings: Embeddings for the chunks (from embed_chunks), in the same order
+        embedding_model: Embedding model the store uses for queries
+    
+    Returns:
+        Updated vector store
+    """
+    text_embeddings = list(zip([chunk.page_content for chunk in chunks], embeddings))
+    metadatas = [chunk.metadata for chunk in chunks]
+    
+    if vector_store is None:
+        # If no existing store, create a new one
+        return FAISS.from_embeddings(
+            text_embeddings,
+            embedding_model,
+            metadatas=metadatas,
+            distance_strategy=DistanceStrategy.COSINE
+        )
+    
+    # Add documents to existing store
+    vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+    return vector_store
+
+def delete_document_from_store(vector_store: FAISS, filename: str, uploaded_at: str) -> Optional[FAISS]:
+    """
+    Deletes a document from the vector store by removing chunks with matching source and uploaded_at.
+    The remaining vectors are kept as they are, so nothing is re-embedded.
+    
+    Args:
+        vector_store: Existing FAISS vector store (modified in place)
         filename: Source filename to delete
         uploaded_at: Upload timestamp to uniquely identify the document
-        embedding_model: Embedding model to rebuild the store
     
     Returns:
-        New vector store without the deleted document, or None if no documents remain
+        The vector store without the deleted document, or None if no documents remain
     """
     if vector_store is None:
         return None
     
-    # Get all documents from the vector store
-    all_docs = []
     docstore = vector_store.docstore
     index_to_docstore_id = vector_store.index_to_docstore_id
     
-    # Extract all documents
+    # Find chunks with matching source and uploaded_at
+    ids_to_delete = []
     for idx in range(len(index_to_docstore_id)):
         doc_id = index_to_docstore_id[idx]
         doc = docstore.search(doc_id)
-        if doc:
-            all_docs.append(doc)
+        if doc and doc.metadata.get('source') == filename and doc.metadata.get('uploaded_at') == uploaded_at:
+            ids_to_delete.append(doc_id)
     
-    # Filter out documents with matching source and uploaded_at
-    filtered_docs = [
-        doc for doc in all_docs
-        if not (doc.metadata.get('source') == filename and doc.metadata.get('uploaded_at') == uploaded_at)
-    ]
-    
-    print(f"Deleting '{filename}': {len(all_docs)} chunks before, {len(filtered_docs)} chunks after, {len(all_docs) - len(filtered_docs)} removed")
+    total = len(index_to_docstore_id)
+    print(f"Deleting '{filename}': {total} chunks before, {total - len(ids_to_delete)} chunks after, {len(ids_to_delete)} removed")
     
     # If no documents remain, return None
-    if not filtered_docs:
+    if len(ids_to_delete) == total:
         print("No documents remain after deletion.")
         return None
     
-    # Rebuild vector store with remaining documents
-    new_vector_store = FAISS.from_documents(
-        documents=filtered_docs,
-        embedding=embedding_model,
-        distance_strategy=DistanceStrategy.COSINE
-    )
+    if ids_to_delete:
+        vector_store.delete(ids_to_delete)
+    
+    return vector_store
+
+def _generation_dir_name(generation: int) -> str:
+    return f"gen-{generation:06d}"
+
+def read_index_manifest(provider=None) -> dict:
+    """
+    Reads the manifest describing the current index generation.
+    This is a tiny JSON read, cheap enough for workers to poll.
+    
+    Returns:
+        Dict with "generation" and "path". An index saved before generations existed
+        is reported as generation 0 stored at the root of the store path. If the manifest
+        is unreadable (e.g. truncated by a crash), the newest generation directory is used.
+    """
+    store_path = get_vector_store_path(provider or MODEL_PROVIDER)
+    manifest_path = os.path.join(store_path, MANIFEST_FILE)
+    
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        return {"generation": int(manifest["generation"]), "path": manifest["path"]}
+    except FileNotFoundError:
+        pass
+    except (ValueError, KeyError, TypeError) as e:
+        newest = _newest_generation_dir(store_path)
+        if newest is None:
+            raise ValueError(f"Corrupt index manifest at {manifest_path} and no generation to fall back to: {e}")
+        print(f"Corrupt index manifest at {manifest_path} ({e}), falling back to {newest['path']}")
+        return newest
     
-    return new_vector_store
+    # Legacy layout: index.faiss directly inside the store path
+    if os.path.exists(os.path.join(store_path, LEGACY_INDEX_FILES[0])):
+        return {"generation": 0, "path": "."}
+    return {"generation": 0, "path": None}
+
+def _newest_generation_dir(store_path: str) -> Optional[dict]:
+    """Finds the newest complete generation directory, for recovering from a corrupt manifest."""
+    newest = None
+    for name in os.listdir(store_path):
+        if not name.startswith("gen-"):
+            continue
+        try:
+            generation = int(name[len("gen-"):])
+        except ValueError:
+            continue
+        if not all(os.path.exists(os.path.join(store_path, name, f)) for f in LEGACY_INDEX_FILES):
+            continue
+        if newest is None or generation > newest["generation"]:
+            newest = {"generation": generation, "path": name}
+    return newest
+
+def read_index_generation(provider=None) -> int:
+    """Returns the generation number of the persisted index (0 if none)."""
+    return read_index_manifest(provider)["generation"]
 
-def save_vector_store(vector_store, provider=None):
+def _fsync_path(path: str):
+    """Flushes a file, or a directory entry list on POSIX, to disk."""
+    if os.path.isdir(path):
+        if os.name == "nt":
+            return  # Directories can't be opened for fsync on Windows
+        fd = os.open(path, os.O_RDONLY)
+    else:
+        fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _publish_generation(store_path: str, generation: int, path: Optional[str]):
+    """
+    Atomically and durably points the manifest at a new generation.
+    The generation's files and the new manifest are fsynced before the swap, so a crash
+    never leaves a manifest that is truncated or points at an incomplete index.
     """
-    Saves the vector store to disk using provider-specific path.
+    if path is not None:
+        generation_path = os.path.join(store_path, path)
+        for name in os.listdir(generation_path):
+            _fsync_path(os.path.join(generation_path, name))
+        _fsync_path(generation_path)
+    
+    manifest_path = os.path.join(store_path, MANIFEST_FILE)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"generation": generation, "path": path}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, manifest_path)
+    _fsync_path(store_path)
+
+def _prune_generations(store_path: str, generation: int):
+    """
+    Deletes generations older than the last KEEP_GENERATIONS, plus the legacy
+    root-level index once a generation has been published to replace it.
+    """
+    for name in LEGACY_INDEX_FILES:
+        legacy_path = os.path.join(store_path, name)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+    
+    for name in os.listdir(store_path):
+        if not name.startswith("gen-"):
+            continue
+        try:
+            old_generation = int(name[len("gen-"):])
+        except ValueError:
+            continue
+        if old_generation <= generation - KEEP_GENERATIONS:
+            shutil.rmtree(os.path.join(store_path, name), ignore_errors=True)
+
+@contextmanager
+def index_write_lock(provider=None):
+    """
+    Exclusive cross-process lock for writing the index of a provider.
+    Whichever worker holds it is the single writer; the others wait their turn.
+    """
+    store_path = get_vector_store_path(provider or MODEL_PROVIDER)
+    lock_path = store_path + ".lock"
+    
+    with open(lock_path, "a+b") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            while True:
+                try:
+                    # LK_LOCK gives up after ~10 seconds, so keep retrying
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def save_vector_store(vector_store, provider=None) -> int:
+    """
+    Saves the vector store to disk as a new generation using provider-specific path.
+    Callers running several workers should hold index_write_lock while saving.
     
     Args:
         vector_store: The FAISS vector store to save
         provider: "ollama" or "openai". If None, uses MODEL_PROVIDER from config.
+    
+    Returns:
+        The generation number that was written
     """
     if provider is None:
         provider = MODEL_PROVIDER
     
     store_path = get_vector_store_path(provider)
+    os.makedirs(store_path, exist_ok=True)
     
-    if os.path.exists(store_path):
-        import shutil
-        shutil.rmtree(store_path)
+    generation = read_index_generation(provider) + 1
+    generation_dir = _generation_dir_name(generation)
+    # A crash mid-save can leave an unpublished directory with this number behind
+    shutil.rmtree(os.path.join(store_path, generation_dir), ignore_errors=True)
+    try:
+        vector_store.save_local(os.path.join(store_path, generation_dir))
+        _publish_generation(store_path, generation, generation_dir)
+    except Exception:
+        # Don't leave a half-written generation behind
+        shutil.rmtree(os.path.join(store_path, generation_dir), ignore_errors=True)
+        raise
+    _prune_generations(store_path, generation)
     
-    vector_store.save_local(store_path)
-    print(f"Vector store saved to: {store_path}")
+    print(f"Vector store saved to: {store_path} (generation {generation})")
+    return generation
 
-def load_vector_store(embedding_model, provider=None):
+def clear_vector_store(provider=None) -> int:
     """
-    Loads the vector store from disk if it exists, using provider-specific path.
+    Publishes an empty generation, so every worker drops its index.
+    
+    Args:
+        provider: "ollama" or "openai". If None, uses MODEL_PROVIDER from config.
+    
+    Returns:
+        The generation number that was written
+    """
+    if provider is None:
+        provider = MODEL_PROVIDER
+    
+    store_path = get_vector_store_path(provider)
+    os.makedirs(store_path, exist_ok=True)
+    
+    generation = read_index_generation(provider) + 1
+    _publish_generation(store_path, generation, None)
+    _prune_generations(store_path, generation)
+    
+    print(f"Vector store cleared at: {store_path} (generation {generation})")
+    return generation
+
+def load_latest_vector_store(embedding_model, provider=None):
+    """
+    Loads the current generation of the vector store from disk.
+    If the generation is pruned by a writer while it is being loaded, the manifest
+    is read again and the newer generation is loaded instead.
     
     Args:
         embedding_model: The embedding model to use for loading
         provider: "ollama" or "openai". If None, uses MODEL_PROVIDER from config.
     
     Returns:
-        FAISS vector store if found, None otherwise
+        Tuple of (FAISS vector store or None, generation number)
     """
     if provider is None:
         provider = MODEL_PROVIDER
     
     store_path = get_vector_store_path(provider)
     
-    if os.path.exists(store_path):
-        print(f"Loading vector store from: {store_path}")
-        return FAISS.load_local(
-            store_path, 
-            embedding_model, 
-            allow_dangerous_deserialization=True
-        )
+    for attempt in range(LOAD_ATTEMPTS):
+        manifest = read_index_manifest(provider)
+        
+        if manifest["path"] is None:
+            print(f"No vector store found at: {store_path}")
+            return None, manifest["generation"]
+        
+        print(f"Loading vector store from: {store_path} (generation {manifest['generation']})")
+        try:
+            vector_store = FAISS.load_local(
+                os.path.join(store_path, manifest["path"]),
+                embedding_model,
+                allow_dangerous_deserialization=True
+            )
+            return vector_store, manifest["generation"]
+        except Exception:
+            # Only retry if a newer generation replaced the one we were loading
+            if attempt == LOAD_ATTEMPTS - 1 or read_index_generation(provider) == manifest["generation"]:
+                raise
+            print(f"Generation {manifest['generation']} was replaced while loading, retrying.")
+
+def load_vector_store(embedding_model, provider=None):
+    """
+    Loads the vector store from disk if it exists, using provider-specific path.
+    
+    Args:
+        embedding_model: The embedding model to use for loading
+        provider: "ollama" or "openai". If None, uses MODEL_PROVIDER from config.
     
-    print(f"No vector store found at: {store_path}")
-    return None
+    Returns:
+        FAISS vector store if found, None otherwise
+    """
+    vector_store, _ = load_latest_vector_store(embedding_model, provider)
+    return vector_store